@@ -0,0 +1,3 @@
+"""MCP server for microscopy image metadata."""
+
+__version__ = "0.1.0"
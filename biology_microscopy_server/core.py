@@ -0,0 +1,648 @@
+"""MCP tools for reading microscopy image metadata.
+
+Exposes metadata-only tools over MCP so an agent can inspect microscopy
+files (OME-TIFF, TIFF, ND2, CZI) without loading pixel data: dimensions,
+channels, physical pixel sizes, scenes, and the full vendor metadata tree.
+"""
+
+import os
+import stat as stat_module
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import Any
+
+import orjson
+from bioio import BioImage
+from fastmcp import FastMCP
+from mcp.types import TextContent
+
+mcp = FastMCP("microscopy-metadata")
+
+SUPPORTED_FORMATS = {".tif", ".tiff", ".ome.tif", ".ome.tiff", ".nd2", ".czi"}
+
+# BioImage construction is expensive (reader auto-detection, IFD scans,
+# metadata parsing), so instances are shared across tool calls.  The cache
+# key includes mtime and size so a file that changes on disk gets reopened.
+_open_lock = threading.Lock()
+
+# Reader auto-detection tries every installed bioio plugin, which dominates
+# open time for small files.  Dispatch on the file extension instead and
+# hand BioImage the reader explicitly, importing plugins lazily.
+_READER_MODULES = {
+    ".ome.tif": ("bioio_ome_tiff", "Reader"),
+    ".ome.tiff": ("bioio_ome_tiff", "Reader"),
+    ".tif": ("bioio_tifffile", "Reader"),
+    ".tiff": ("bioio_tifffile", "Reader"),
+    ".nd2": ("bioio_nd2", "Reader"),
+    ".czi": ("bioio_czi", "Reader"),
+}
+_reader_cache: dict[str, Any] = {}
+
+
+def _file_suffix(path: Path) -> str:
+    """Lowercased suffix, keeping double suffixes like ``.ome.tiff`` intact."""
+    suffix = "".join(path.suffixes[-2:]).lower()
+    return suffix if suffix in _READER_MODULES else path.suffix.lower()
+
+
+def _pick_reader(path: Path) -> Any:
+    """Return the bioio reader class for ``path``, or None if unknown."""
+    suffix = _file_suffix(path)
+    if suffix in _reader_cache:
+        return _reader_cache[suffix]
+    try:
+        module_name, class_name = _READER_MODULES[suffix]
+        module = __import__(module_name)
+        reader = getattr(module, class_name)
+    except (KeyError, ImportError, AttributeError):
+        reader = None
+    _reader_cache[suffix] = reader
+    return reader
+
+
+@lru_cache(maxsize=32)
+def _open_bioimage(path_str: str, mtime_ns: int, size: int) -> BioImage:
+    reader = _pick_reader(Path(path_str))
+    if reader is not None:
+        return BioImage(path_str, reader=reader)
+    return BioImage(path_str)
+
+
+def _stat_or_none(file_path: Path) -> os.stat_result | None:
+    """One stat(2) call covering existence, file-ness and size.
+
+    Path.exists()/is_file()/stat() each issue a separate syscall, which
+    adds up on network filesystems; every tool funnels through this
+    single call instead.
+    """
+    try:
+        return os.stat(file_path)
+    except OSError:
+        return None
+
+
+def _cached_bioimage(file_path: Path, st: os.stat_result | None = None) -> BioImage:
+    if st is None:
+        st = file_path.stat()
+    with _open_lock:
+        return _open_bioimage(str(file_path), st.st_mtime_ns, st.st_size)
+
+
+# Exact-type scalar check: `type(obj) in _SCALAR_TYPES` is a frozenset
+# lookup, noticeably faster than a chain of isinstance calls on the hot
+# leaf-node path (most nodes in an OME tree are scalars).
+_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+
+
+def _serialize_metadata(root: Any) -> Any:
+    """Convert a metadata object tree into JSON-safe values.
+
+    Uses an explicit stack instead of recursion: OME metadata trees can
+    contain thousands of nodes and this is the hot path of
+    read_microscopy_metadata. Shared subtrees are serialized once via an
+    id() memo.
+    """
+    if type(root) in _SCALAR_TYPES:
+        return root
+    holder: list = [None]
+    memo: dict[int, Any] = {}
+    stack: list[tuple[Any, Any, Any]] = [(root, holder, 0)]
+    while stack:
+        obj, parent, key = stack.pop()
+        if type(obj) in _SCALAR_TYPES:
+            parent[key] = obj
+            continue
+        oid = id(obj)
+        if oid in memo:
+            parent[key] = memo[oid]
+            continue
+        if isinstance(obj, dict):
+            out: Any = {}
+            memo[oid] = out
+            parent[key] = out
+            for k, v in obj.items():
+                k = str(k)
+                out[k] = None
+                stack.append((v, out, k))
+        elif isinstance(obj, (list, tuple)):
+            out = [None] * len(obj)
+            memo[oid] = out
+            parent[key] = out
+            for i, v in enumerate(obj):
+                stack.append((v, out, i))
+        elif hasattr(obj, "__dict__"):
+            out = {}
+            memo[oid] = out
+            parent[key] = out
+            for k, v in vars(obj).items():
+                if k[0] != "_":
+                    out[k] = None
+                    stack.append((v, out, k))
+        else:
+            parent[key] = str(obj)
+    return holder[0]
+
+
+@lru_cache(maxsize=32)
+def _serialized_metadata(path_str: str, mtime_ns: int, size: int) -> Any:
+    img = _open_bioimage(path_str, mtime_ns, size)
+    return _serialize_metadata(img.metadata)
+
+
+def _pixel_sizes_dict(img: BioImage) -> dict:
+    pps = img.physical_pixel_sizes
+    return {"X": pps.X, "Y": pps.Y, "Z": pps.Z, "unit": "micrometer"}
+
+
+_OME_DTYPES = {"float": "float32", "double": "float64", "bit": "bool"}
+
+
+def _ome_tag(element: Any) -> str:
+    """Element tag with any XML namespace stripped."""
+    tag = element.tag
+    return tag.rsplit("}", 1)[-1] if "}" in tag else tag
+
+
+def _quick_dims_nd2(path: Path) -> dict:
+    import nd2
+
+    with nd2.ND2File(path) as f:
+        sizes = dict(f.sizes)
+        voxel = f.voxel_size()
+        channels = [c.channel.name for c in (f.metadata.channels or [])]
+        n_positions = sizes.get("P", 1)
+        dtype = str(f.dtype)
+    return {
+        "dimensions": sizes,
+        "dtype": dtype,
+        "channel_names": channels,
+        "physical_pixel_sizes": {
+            "X": voxel.x,
+            "Y": voxel.y,
+            "Z": voxel.z,
+            "unit": "micrometer",
+        },
+        "scenes": [f"Position:{i}" for i in range(n_positions)],
+    }
+
+
+def _quick_dims_ome_tiff(path: Path) -> dict | None:
+    import xml.etree.ElementTree as ET
+
+    import tifffile
+
+    with tifffile.TiffFile(path) as tif:
+        ome = tif.ome_metadata
+    if not ome:
+        return None
+    root = ET.fromstring(ome)
+    images = [el for el in root.iter() if _ome_tag(el) == "Image"]
+    if not images:
+        return None
+    pixels = next(
+        (el for el in images[0].iter() if _ome_tag(el) == "Pixels"), None
+    )
+    if pixels is None:
+        return None
+    attrs = pixels.attrib
+    dims = {
+        axis: int(attrs[f"Size{axis}"])
+        for axis in "TCZYX"
+        if f"Size{axis}" in attrs
+    }
+    channel_names = [
+        el.attrib.get("Name", f"Channel:{i}")
+        for i, el in enumerate(el for el in pixels if _ome_tag(el) == "Channel")
+    ]
+    ome_type = attrs.get("Type", "")
+    sizes = {
+        axis: float(attrs[f"PhysicalSize{axis}"])
+        if f"PhysicalSize{axis}" in attrs
+        else None
+        for axis in "XYZ"
+    }
+    return {
+        "dimensions": dims,
+        "dtype": _OME_DTYPES.get(ome_type, ome_type),
+        "channel_names": channel_names,
+        "physical_pixel_sizes": {**sizes, "unit": "micrometer"},
+        "scenes": [
+            el.attrib.get("ID", f"Image:{i}") for i, el in enumerate(images)
+        ],
+    }
+
+
+def _quick_dims_tiff(path: Path) -> dict:
+    import tifffile
+
+    with tifffile.TiffFile(path) as tif:
+        if tif.series:
+            series = tif.series[0]
+            dims = dict(zip(series.axes.replace("S", "C"), series.shape))
+            dtype = str(series.dtype)
+            n_scenes = len(tif.series)
+        else:
+            page = tif.pages[0]
+            dims = dict(zip("YX", page.shape))
+            dtype = str(page.dtype)
+            n_scenes = 1
+    return {
+        "dimensions": dims,
+        "dtype": dtype,
+        "channel_names": [],
+        "physical_pixel_sizes": {"X": None, "Y": None, "Z": None, "unit": "micrometer"},
+        "scenes": [f"Image:{i}" for i in range(n_scenes)],
+    }
+
+
+def _quick_dims(path: Path) -> dict | None:
+    """Read dims/channels/pixel sizes through a format-specific fast path.
+
+    Avoids instantiating a full BioImage (reader discovery, complete
+    metadata parse) for the lightweight info tools. Returns None when the
+    format has no fast path or the fast path fails, in which case callers
+    fall back to BioImage.
+    """
+    suffix = _file_suffix(path)
+    try:
+        if suffix == ".nd2":
+            return _quick_dims_nd2(path)
+        if suffix in (".ome.tif", ".ome.tiff"):
+            return _quick_dims_ome_tiff(path)
+        if suffix in (".tif", ".tiff"):
+            return _quick_dims_tiff(path)
+    except Exception:
+        return None
+    return None
+
+
+def _image_summary(path: Path, st: os.stat_result | None = None) -> dict:
+    """Normalized summary (dims, dtype, channels, pixel sizes, scenes).
+
+    Prefers the _quick_dims fast path; falls back to the cached BioImage.
+    """
+    info = _quick_dims(path)
+    if info is not None:
+        info["current_scene"] = info["scenes"][0] if info["scenes"] else None
+        return info
+    img = _cached_bioimage(path, st)
+    return {
+        "dimensions": dict(zip(img.dims.order, img.shape)),
+        "dtype": str(img.dtype),
+        "channel_names": list(img.channel_names or []),
+        "physical_pixel_sizes": _pixel_sizes_dict(img),
+        "scenes": list(img.scenes),
+        "current_scene": img.current_scene,
+    }
+
+
+def _tool_errors(fn):
+    """Wrap a tool implementation in the shared error envelope.
+
+    Replaces the identical except-blocks each tool used to carry.
+    traceback.format_exc walks frames and loads source lines from disk,
+    so it runs only when an exception actually occurs — never on the
+    success path.
+    """
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            return {
+                "error": str(e),
+                "error_type": type(e).__name__,
+                "traceback": traceback.format_exc(),
+            }
+
+    return wrapper
+
+
+def _run_batch(fn, file_paths: list[str]) -> list[dict]:
+    """Map a per-file tool implementation over many paths on a thread pool."""
+    if not file_paths:
+        return []
+    workers = min(len(file_paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(fn, file_paths))
+
+
+def _ome_metadata_streamed(path: Path) -> dict | None:
+    """Parse tifffile's OME-XML string into a nested tag/attrib tree.
+
+    Streams with ElementTree.iterparse, pushing a dict per start event
+    and attaching it under its parent on the end event, so each element
+    stays nested under the Image/Pixels it belongs to (repeated child
+    tags become lists). Clearing each element after its end event keeps
+    the Element tree itself from being retained; the output dicts still
+    hold one entry per element, but that output must exist anyway — the
+    saving is the DOM that would otherwise sit alongside it.
+    """
+    import io
+    from xml.etree.ElementTree import iterparse
+
+    import tifffile
+
+    with tifffile.TiffFile(path) as tif:
+        ome = tif.ome_metadata
+    if not ome:
+        return None
+    root: dict[str, Any] = {}
+    stack: list[dict[str, Any]] = [root]
+    for event, elem in iterparse(io.StringIO(ome), events=("start", "end")):
+        if event == "start":
+            stack.append({})
+            continue
+        node = stack.pop()
+        # Children ended first and already live in node; setdefault so
+        # an attribute can never clobber a child subtree of the same
+        # name.
+        for k, v in elem.attrib.items():
+            node.setdefault(k, v)
+        if elem.text and elem.text.strip():
+            node.setdefault("text", elem.text.strip())
+        parent = stack[-1]
+        tag = _ome_tag(elem)
+        existing = parent.get(tag)
+        if existing is None:
+            parent[tag] = node
+        elif isinstance(existing, list):
+            existing.append(node)
+        else:
+            parent[tag] = [existing, node]
+        elem.clear()
+    return root
+
+
+@lru_cache(maxsize=32)
+def _metadata_json(path_str: str, mtime_ns: int, size: int) -> bytes:
+    """Full-metadata response pre-serialized to JSON bytes.
+
+    orjson serializes the deeply nested metadata dict several times
+    faster than the stdlib encoder, and caching the bytes per
+    (path, mtime, size) makes repeat calls O(1) with no re-traversal.
+    """
+    p = Path(path_str)
+    if _file_suffix(p) in (".ome.tif", ".ome.tiff"):
+        metadata = _ome_metadata_streamed(p)
+        if metadata is not None:
+            info = _image_summary(p)
+            result = {
+                "file_path": path_str,
+                "file_size_bytes": size,
+                "dimensions": info["dimensions"],
+                "dtype": info["dtype"],
+                "channel_names": info["channel_names"],
+                "physical_pixel_sizes": info["physical_pixel_sizes"],
+                "scenes": info["scenes"],
+                "metadata": metadata,
+            }
+            return orjson.dumps(
+                result,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+            )
+    img = _open_bioimage(path_str, mtime_ns, size)
+    result = {
+        "file_path": path_str,
+        "file_size_bytes": size,
+        "dimensions": dict(zip(img.dims.order, img.shape)),
+        "dtype": str(img.dtype),
+        "channel_names": list(img.channel_names or []),
+        "physical_pixel_sizes": _pixel_sizes_dict(img),
+        "scenes": list(img.scenes),
+        "metadata": _serialized_metadata(path_str, mtime_ns, size),
+    }
+    return orjson.dumps(
+        result, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    )
+
+
+# Fields that are cheap to produce (header reads only). The full
+# "metadata" tree is the expensive one and must be requested explicitly.
+_CHEAP_FIELDS = (
+    "file_path",
+    "file_size_bytes",
+    "dimensions",
+    "dtype",
+    "channel_names",
+    "physical_pixel_sizes",
+    "scenes",
+)
+
+
+@mcp.tool()
+@_tool_errors
+def read_microscopy_metadata(
+    file_path: str, fields: list[str] | None = None
+) -> dict | TextContent:
+    """Read metadata of a microscopy image file.
+
+    fields selects which keys to return. By default everything except
+    the full "metadata" tree is included — that tree can be multi-MB for
+    OME files and most callers only need dims/channels, so the expensive
+    dump is opt-in via fields=["metadata", ...].
+    """
+    p = Path(file_path)
+    st = _stat_or_none(p)
+    if st is None:
+        return {"error": f"File not found: {file_path}"}
+    wanted = tuple(fields) if fields else _CHEAP_FIELDS
+    if "metadata" in wanted:
+        payload = _metadata_json(str(p), st.st_mtime_ns, st.st_size)
+        if set(_CHEAP_FIELDS) <= set(wanted):
+            # Everything requested: hand fastmcp the cached JSON verbatim,
+            # skipping a second serialization of the (potentially huge)
+            # dict.
+            return TextContent(type="text", text=payload.decode())
+        data = orjson.loads(payload)
+        return {k: data[k] for k in wanted if k in data}
+    # Cheap subset: header fast paths only, no metadata walk at all.
+    info = _image_summary(p, st)
+    result = {
+        "file_path": str(p),
+        "file_size_bytes": st.st_size,
+        "dimensions": info["dimensions"],
+        "dtype": info["dtype"],
+        "channel_names": info["channel_names"],
+        "physical_pixel_sizes": info["physical_pixel_sizes"],
+        "scenes": info["scenes"],
+    }
+    return {k: result[k] for k in wanted if k in result}
+
+
+@_tool_errors
+def _get_image_info(file_path: str) -> dict:
+    p = Path(file_path)
+    st = _stat_or_none(p)
+    if st is None:
+        return {"error": f"File not found: {file_path}"}
+    info = _image_summary(p, st)
+    return {
+        "file_path": str(p),
+        "dimensions": info["dimensions"],
+        "dtype": info["dtype"],
+        "n_channels": info["dimensions"].get(
+            "C", len(info["channel_names"]) or 1
+        ),
+        "channel_names": info["channel_names"],
+        "n_scenes": len(info["scenes"]),
+    }
+
+
+@mcp.tool()
+def get_image_info(file_path: str) -> dict:
+    """Get basic image information: dimensions, dtype and channels."""
+    return _get_image_info(file_path)
+
+
+@mcp.tool()
+def batch_get_image_info(file_paths: list[str]) -> list[dict]:
+    """Get basic image information for many files in parallel.
+
+    Opens files on a thread pool: bioio/tifffile release the GIL during
+    file I/O and decompression, so a directory scan over N files runs
+    concurrently instead of serializing N opens.
+    """
+    return _run_batch(_get_image_info, file_paths)
+
+
+@mcp.tool()
+@_tool_errors
+def list_scenes(file_path: str) -> dict:
+    """List the scenes (positions/series) contained in a microscopy file."""
+    p = Path(file_path)
+    st = _stat_or_none(p)
+    if st is None:
+        return {"error": f"File not found: {file_path}"}
+    info = _image_summary(p, st)
+    return {
+        "file_path": str(p),
+        "n_scenes": len(info["scenes"]),
+        "scenes": info["scenes"],
+        "current_scene": info["current_scene"],
+    }
+
+
+@mcp.tool()
+@_tool_errors
+def get_channel_info(file_path: str) -> dict:
+    """Get the channel count and channel names of a microscopy file."""
+    p = Path(file_path)
+    st = _stat_or_none(p)
+    if st is None:
+        return {"error": f"File not found: {file_path}"}
+    info = _image_summary(p, st)
+    names = info["channel_names"]
+    return {
+        "file_path": str(p),
+        "n_channels": info["dimensions"].get("C", len(names) or 1),
+        "channel_names": names,
+        "channels": [
+            {"index": i, "name": name} for i, name in enumerate(names)
+        ],
+    }
+
+
+@mcp.tool()
+@_tool_errors
+def get_physical_dimensions(file_path: str) -> dict:
+    """Get physical pixel sizes and the resulting image extent in microns."""
+    p = Path(file_path)
+    st = _stat_or_none(p)
+    if st is None:
+        return {"error": f"File not found: {file_path}"}
+    info = _image_summary(p, st)
+    pps = info["physical_pixel_sizes"]
+    dims = info["dimensions"]
+    extent = {}
+    for axis in "XYZ":
+        size = pps.get(axis)
+        if size is not None and axis in dims:
+            extent[axis] = round(dims[axis] * size, 3)
+    return {
+        "file_path": str(p),
+        "physical_pixel_sizes": pps,
+        "extent_micrometers": extent,
+    }
+
+
+# First-bytes signatures of the supported container formats. Checking
+# these before any reader open turns the worst case (an invalid file,
+# where auto-detection would try every plugin) into a 16-byte read.
+_MAGIC_NUMBERS = (
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+    (b"II+\x00", "bigtiff"),
+    (b"MM\x00+", "bigtiff"),
+    (b"\xda\xce\xbe\n", "nd2"),
+    (b"ZISRAWFILE", "czi"),
+)
+
+
+def _sniff_format(path: Path) -> str | None:
+    """Identify the container format from the file's first 16 bytes."""
+    with open(path, "rb") as f:
+        head = f.read(16)
+    for magic, fmt in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return fmt
+    return None
+
+
+@_tool_errors
+def _validate_microscopy_file(file_path: str) -> dict:
+    p = Path(file_path)
+    st = _stat_or_none(p)
+    if st is None:
+        return {"valid": False, "reason": f"File not found: {file_path}"}
+    if not stat_module.S_ISREG(st.st_mode):
+        return {"valid": False, "reason": f"Not a regular file: {file_path}"}
+    size = st.st_size
+    if size == 0:
+        return {"valid": False, "reason": "File is empty"}
+    suffix = "".join(p.suffixes[-2:]).lower()
+    if suffix not in SUPPORTED_FORMATS and p.suffix.lower() not in SUPPORTED_FORMATS:
+        return {
+            "valid": False,
+            "reason": f"Unsupported file extension: {p.suffix}",
+            "supported_formats": sorted(SUPPORTED_FORMATS),
+        }
+    detected = _sniff_format(p)
+    if detected is None:
+        return {
+            "valid": False,
+            "reason": "File content does not match any supported "
+            "microscopy format (unrecognized magic bytes)",
+        }
+    # _image_summary opens TIFF-family files with tifffile, which only
+    # maps the IFD chain and page headers — a multi-gigabyte stack is
+    # validated without reading pixel strips into RAM. BioImage is the
+    # fallback for formats without a header-only fast path.
+    info = _image_summary(p, st)
+    return {
+        "valid": True,
+        "file_path": str(p),
+        "file_size_bytes": size,
+        "detected_format": detected,
+        "dimensions": info["dimensions"],
+    }
+
+
+@mcp.tool()
+def validate_microscopy_file(file_path: str) -> dict:
+    """Check whether a file exists and can be opened as a microscopy image."""
+    return _validate_microscopy_file(file_path)
+
+
+@mcp.tool()
+def batch_validate_microscopy_file(file_paths: list[str]) -> list[dict]:
+    """Validate many microscopy files in parallel on a thread pool."""
+    return _run_batch(_validate_microscopy_file, file_paths)
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,3 @@
+"""MCP server for Boltz-2 protein structure prediction."""
+
+__version__ = "0.1.0"
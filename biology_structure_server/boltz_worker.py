@@ -0,0 +1,66 @@
+"""Persistent Boltz prediction worker.
+
+Launched once per LocalBoltzRunner as
+``python -m biology_structure_server.boltz_worker``. Reads one JSON
+request per line on stdin and writes one JSON response per line on
+stdout. Keeping the process alive amortizes interpreter startup, torch
+import, CUDA context creation and model-weight residency across
+predictions instead of paying them on every ``boltz predict`` spawn.
+"""
+
+import json
+import os
+import sys
+
+
+def _run_prediction(request: dict) -> dict:
+    # Imported lazily so the worker responds to malformed requests even
+    # when boltz is missing; the import (and everything it loads) happens
+    # once per worker process.
+    from boltz.main import cli
+
+    args = [
+        "predict",
+        request["fasta_path"],
+        "--out_dir",
+        request["output_dir"],
+        "--recycling_steps",
+        str(request.get("recycling_steps", 3)),
+        "--sampling_steps",
+        str(request.get("sampling_steps", 200)),
+        "--diffusion_samples",
+        str(request.get("diffusion_samples", 1)),
+    ]
+    try:
+        cli.main(args=args, standalone_mode=False)
+    except SystemExit as e:
+        if e.code not in (0, None):
+            return {"ok": False, "error": f"boltz exited with code {e.code}"}
+    return {"ok": True}
+
+
+def main() -> None:
+    # The boltz CLI echoes progress to stdout ("Checking input data."
+    # and friends), which would land in the middle of the JSON-line
+    # protocol and desynchronize the pipe for every later request.
+    # Reserve a private dup of the real stdout for protocol responses,
+    # then point fd 1 and sys.stdout at stderr so everything the
+    # prediction prints — Python-level or C-level — goes to the log
+    # side.
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    sys.stdout = sys.stderr
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            response = _run_prediction(json.loads(line))
+        except Exception as e:
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        protocol.write(json.dumps(response) + "\n")
+        protocol.flush()
+
+
+if __name__ == "__main__":
+    main()
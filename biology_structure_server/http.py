@@ -0,0 +1,42 @@
+"""Shared HTTP plumbing for the structure-prediction package.
+
+One pooled HTTP/2 client serves every component that talks to the
+network, so keep-alive connections are shared instead of each consumer
+opening its own pool. Consumers that want isolation (tests, mocks) can
+inject their own client instead.
+"""
+
+import asyncio
+import atexit
+
+import httpx
+
+_LIMITS = httpx.Limits(
+    max_keepalive_connections=32,
+    max_connections=64,
+    keepalive_expiry=90.0,
+)
+
+ASYNC_CLIENT = httpx.AsyncClient(http2=True, limits=_LIMITS)
+
+
+def new_async_client() -> httpx.AsyncClient:
+    """A client configured like the shared one, for consumers that need
+    their own loop affinity (pooled connections are bound to the event
+    loop they were opened on and must not be shared across loops)."""
+    return httpx.AsyncClient(http2=True, limits=_LIMITS)
+
+
+def close_all() -> None:
+    """Close the shared client. Registered atexit; safe to call twice."""
+    if ASYNC_CLIENT.is_closed:
+        return
+    try:
+        asyncio.run(ASYNC_CLIENT.aclose())
+    except RuntimeError:
+        # Called from within a running loop during shutdown; the
+        # sockets are torn down with the process anyway.
+        pass
+
+
+atexit.register(close_all)
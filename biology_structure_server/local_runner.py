@@ -0,0 +1,326 @@
+"""Run Boltz-2 structure predictions on the local machine.
+
+Wraps the ``boltz predict`` CLI: writes the input FASTA, launches the
+prediction, and collects the resulting mmCIF structure and confidence
+scores from the output tree.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from .utils import recommend_gpu
+
+
+@dataclass
+class LocalPredictionResult:
+    """Outcome of a local Boltz prediction.
+
+    The mmCIF text is not loaded eagerly — large complexes produce
+    hundreds of MB of structure text, and many callers only want the
+    path or the confidence scores. Call :meth:`get_structure` to read
+    (and cache) the text on demand.
+    """
+
+    success: bool
+    structure: str | None = None
+    structure_path: str | None = None
+    confidence_scores: dict | None = None
+    output_dir: str | None = None
+    error: str | None = None
+
+    def get_structure(self) -> str | None:
+        """Return the mmCIF text, reading it from disk on first access."""
+        if self.structure is None and self.structure_path is not None:
+            # Reading bytes and decoding once is ~2x faster than
+            # text-mode read() (no universal-newline translation).
+            data = Path(self.structure_path).read_bytes()
+            self.structure = data.decode("ascii", "replace")
+        return self.structure
+
+
+@lru_cache(maxsize=1)
+def check_boltz_installed() -> dict:
+    """Report whether the boltz package is importable and its version.
+
+    Memoized: is_available() runs before every prediction and whether
+    boltz is installed does not change within a process.
+    """
+    try:
+        import boltz
+    except ImportError:
+        return {"installed": False, "version": None}
+    return {"installed": True, "version": getattr(boltz, "__version__", "unknown")}
+
+
+@lru_cache(maxsize=1)
+def _gpu_props() -> tuple[bool, str | None, float]:
+    """(cuda_available, device_name, vram_total_gb) — static per process."""
+    try:
+        import torch
+    except ImportError:
+        return False, "torch is not installed", 0.0
+    if not torch.cuda.is_available():
+        return False, "no CUDA device detected", 0.0
+    props = torch.cuda.get_device_properties(0)
+    return True, props.name, round(props.total_memory / 1024**3, 1)
+
+
+def check_gpu_available() -> dict:
+    """Report CUDA availability and VRAM of the first GPU.
+
+    Device identity and total VRAM come from the memoized _gpu_props;
+    only the free-VRAM query hits the driver on each call.
+    """
+    available, name_or_reason, vram_total_gb = _gpu_props()
+    if not available:
+        return {"available": False, "reason": name_or_reason}
+    import torch
+
+    # mem_get_info asks the driver for (free, total) directly: no device
+    # sync, no flushing of the caching allocator, and it reports
+    # system-wide free VRAM rather than this process's allocator state.
+    free_bytes, _ = torch.cuda.mem_get_info(0)
+    return {
+        "available": True,
+        "device_name": name_or_reason,
+        "vram_total_gb": vram_total_gb,
+        "vram_free_gb": round(free_bytes / 1024**3, 1),
+    }
+
+
+def _get_gpu_recommendation(vram_needed_gb: float) -> str:
+    """Suggest hardware able to fit a prediction of the given VRAM need."""
+    return recommend_gpu(vram_needed_gb)
+
+
+class LocalBoltzRunner:
+    """Drives the boltz CLI and harvests its outputs."""
+
+    def __init__(self, output_base_dir: str | None = None, persistent: bool = True):
+        self.output_base_dir = output_base_dir or os.path.join(
+            tempfile.gettempdir(), "boltz_predictions"
+        )
+        # With persistent=True predictions run in a long-lived worker
+        # process (see boltz_worker), so model load happens once per
+        # runner lifetime instead of once per prediction.
+        self.persistent = persistent
+        self._worker: subprocess.Popen | None = None
+
+    def close(self) -> None:
+        """Shut down the persistent worker, if one is running."""
+        if self._worker is not None and self._worker.poll() is None:
+            self._worker.stdin.close()
+            self._worker.terminate()
+            self._worker.wait(timeout=10)
+        self._worker = None
+
+    def _ensure_worker(self) -> subprocess.Popen:
+        if self._worker is None or self._worker.poll() is not None:
+            self._worker = subprocess.Popen(
+                [sys.executable, "-m", "biology_structure_server.boltz_worker"],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+        return self._worker
+
+    def _worker_predict(self, request: dict) -> dict:
+        worker = self._ensure_worker()
+        worker.stdin.write(json.dumps(request) + "\n")
+        worker.stdin.flush()
+        line = worker.stdout.readline()
+        if not line:
+            raise RuntimeError("boltz worker exited unexpectedly")
+        return json.loads(line)
+
+    def is_available(self, refresh: bool = False) -> dict:
+        """Availability of local prediction; refresh=True re-probes the
+        environment (e.g. after installing boltz or freeing a GPU)."""
+        if refresh:
+            check_boltz_installed.cache_clear()
+            _gpu_props.cache_clear()
+        boltz = check_boltz_installed()
+        gpu = check_gpu_available()
+        info = {
+            "available": boltz["installed"] and gpu.get("available", False),
+            "boltz": boltz,
+            "gpu": gpu,
+        }
+        if not info["available"] and gpu.get("vram_total_gb"):
+            info["recommendation"] = _get_gpu_recommendation(gpu["vram_total_gb"])
+        return info
+
+    def predict_structure(
+        self,
+        sequences: list[dict],
+        output_dir: str | None = None,
+        recycling_steps: int = 3,
+        sampling_steps: int = 200,
+        diffusion_samples: int = 1,
+    ) -> LocalPredictionResult:
+        """Predict a structure for a list of {id, molecule_type, sequence}."""
+        if output_dir is None:
+            os.makedirs(self.output_base_dir, exist_ok=True)
+            output_dir = tempfile.mkdtemp(prefix="boltz_", dir=self.output_base_dir)
+        else:
+            os.makedirs(output_dir, exist_ok=True)
+        fasta_path = os.path.join(output_dir, "input.fasta")
+        self._write_fasta(sequences, fasta_path)
+        try:
+            if self.persistent:
+                response = self._worker_predict(
+                    {
+                        "fasta_path": fasta_path,
+                        "output_dir": output_dir,
+                        "recycling_steps": recycling_steps,
+                        "sampling_steps": sampling_steps,
+                        "diffusion_samples": diffusion_samples,
+                    }
+                )
+                if not response.get("ok"):
+                    raise RuntimeError(
+                        response.get("error", "boltz worker prediction failed")
+                    )
+            else:
+                self._run_boltz_cli(
+                    fasta_path,
+                    output_dir,
+                    recycling_steps,
+                    sampling_steps,
+                    diffusion_samples,
+                )
+        except (OSError, RuntimeError, ValueError) as e:
+            return LocalPredictionResult(success=False, error=str(e), output_dir=output_dir)
+        cif_path, scores_path = self._collect_outputs(output_dir)
+        if cif_path is None:
+            return LocalPredictionResult(
+                success=False,
+                error="boltz completed but produced no .cif structure",
+                output_dir=output_dir,
+            )
+        confidence_scores = None
+        if scores_path is not None:
+            with open(scores_path, "r") as f:
+                confidence_scores = json.load(f)
+        return LocalPredictionResult(
+            success=True,
+            structure_path=cif_path,
+            confidence_scores=confidence_scores,
+            output_dir=output_dir,
+        )
+
+    def _write_fasta(self, sequences: list[dict], fasta_path: str) -> None:
+        # Binary mode skips text-mode newline translation, and each record
+        # becomes one join over memoryview slices plus a single write —
+        # instead of one transient string and one write per 80-char line.
+        with open(fasta_path, "wb") as f:
+            for i, seq in enumerate(sequences):
+                chain_id = seq.get("id") or chr(ord("A") + i)
+                molecule_type = seq.get("molecule_type", "protein")
+                f.write(f">{chain_id}|{molecule_type}\n".encode("ascii"))
+                data = memoryview(seq["sequence"].encode("ascii"))
+                f.write(
+                    b"\n".join(data[j : j + 80] for j in range(0, len(data), 80))
+                    + b"\n"
+                )
+
+    def _run_boltz_cli(
+        self,
+        fasta_path: str,
+        output_dir: str,
+        recycling_steps: int,
+        sampling_steps: int,
+        diffusion_samples: int,
+    ) -> None:
+        cmd = [
+            "boltz",
+            "predict",
+            fasta_path,
+            "--out_dir",
+            output_dir,
+            "--recycling_steps",
+            str(recycling_steps),
+            "--sampling_steps",
+            str(sampling_steps),
+            "--diffusion_samples",
+            str(diffusion_samples),
+        ]
+        # Long predictions log hundreds of MB of diffusion-step progress;
+        # capture_output=True would buffer it all in memory (and risks a
+        # pipe-buffer stall). Stream stderr to a log file instead and keep
+        # only its tail for error reporting.
+        stderr_log_path = os.path.join(output_dir, "boltz.stderr.log")
+        with open(stderr_log_path, "wb") as stderr_log:
+            result = subprocess.run(
+                cmd, stdout=subprocess.DEVNULL, stderr=stderr_log
+            )
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"boltz predict failed with code {result.returncode}: "
+                f"{self._tail(stderr_log_path)} (full log: {stderr_log_path})"
+            )
+
+    @staticmethod
+    def _tail(log_path: str, max_bytes: int = 8192) -> str:
+        """Last max_bytes of a log file, decoded leniently."""
+        try:
+            with open(log_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - max_bytes))
+                return f.read().decode("utf-8", "replace").strip()
+        except OSError:
+            return ""
+
+    def _collect_outputs(self, output_dir: str) -> tuple[str | None, str | None]:
+        """Find the predicted .cif and confidence-score JSON in one walk.
+
+        Uses os.scandir so file/dir classification comes from the getdents
+        batch instead of a stat per entry, and classifies both output kinds
+        in a single traversal. The boltz_results subtree the CLI writes is
+        scanned first; the full output directory is only walked as a
+        fallback.
+        """
+        roots = [
+            entry.path
+            for entry in os.scandir(output_dir)
+            if entry.is_dir() and entry.name.startswith("boltz_results")
+        ] or [output_dir]
+        for root in roots:
+            cif_path = scores_path = None
+            stack = [root]
+            # Stop walking as soon as both outputs are found; DirEntry
+            # type checks use follow_symlinks=False so classification
+            # comes from the getdents batch with no extra stat, even on
+            # NFS/Lustre.
+            while stack and (cif_path is None or scores_path is None):
+                current = stack.pop()
+                try:
+                    entries = os.scandir(current)
+                except OSError:
+                    continue
+                with entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            name = entry.name
+                            if cif_path is None and name.endswith(".cif"):
+                                cif_path = entry.path
+                            elif (
+                                scores_path is None
+                                and name.startswith("confidence")
+                                and name.endswith(".json")
+                            ):
+                                scores_path = entry.path
+                        if cif_path is not None and scores_path is not None:
+                            break
+            if cif_path is not None:
+                return cif_path, scores_path
+        return None, None
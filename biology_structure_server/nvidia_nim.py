@@ -0,0 +1,468 @@
+"""Client for the NVIDIA NIM Boltz-2 structure prediction API."""
+
+import asyncio
+import atexit
+import hashlib
+import json
+import mmap
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+import cachetools
+import httpx
+import orjson
+
+from .http import ASYNC_CLIENT, new_async_client
+
+NIM_PREDICT_ENDPOINT = (
+    "https://health.api.nvidia.com/v1/biology/mit/boltz2/predict"
+)
+NIM_HEALTH_ENDPOINT = "https://health.api.nvidia.com/v1/health/ready"
+MAX_POLYMERS = 12
+MAX_RESIDUES = 2000
+
+PREDICTION_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "boltz2"
+)
+_MEMORY_CACHE_MAX = 64
+_HEALTH_CHECK_TTL = 30.0
+
+
+class NvidiaAPIError(Exception):
+    """Raised when the NIM API rejects or fails a request."""
+
+
+@dataclass(slots=True, frozen=True)
+class Polymer:
+    """One chain of a complex: protein, dna or rna.
+
+    Frozen with slots: no per-instance __dict__, and nothing mutates a
+    record once built. The cached to_dict fragment and the interned
+    IDs are written via object.__setattr__ since the class is frozen.
+    to_dict caches its payload fragment because a screening loop reuses
+    the same Polymer across thousands of ligand submissions.
+    """
+
+    id: str
+    molecule_type: str
+    sequence: str
+    _cached: dict | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        # Chain IDs and molecule types repeat across every polymer in a
+        # screen; interning dedups the strings and makes orjson emit
+        # them from one allocation.
+        object.__setattr__(self, "id", sys.intern(self.id))
+        object.__setattr__(
+            self, "molecule_type", sys.intern(self.molecule_type)
+        )
+
+    def to_dict(self) -> dict:
+        if self._cached is None:
+            object.__setattr__(
+                self,
+                "_cached",
+                {
+                    "id": self.id,
+                    "molecule_type": self.molecule_type,
+                    "sequence": self.sequence,
+                },
+            )
+        return self._cached
+
+
+@dataclass(slots=True, frozen=True)
+class Ligand:
+    """A small molecule given as SMILES."""
+
+    id: str
+    smiles: str
+    predict_affinity: bool = True
+    _cached: dict | None = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def __post_init__(self):
+        object.__setattr__(self, "id", sys.intern(self.id))
+
+    def to_dict(self) -> dict:
+        if self._cached is None:
+            # predict_affinity=True is the NIM default, so omit it and
+            # shave payload bytes on the wire.
+            cached = {"id": self.id, "smiles": self.smiles}
+            if not self.predict_affinity:
+                cached["predict_affinity"] = False
+            object.__setattr__(self, "_cached", cached)
+        return self._cached
+
+
+@dataclass(slots=True, frozen=True)
+class PredictionResult:
+    """Parsed NIM prediction response."""
+
+    structure: str
+    structure_format: str
+    confidence_scores: list
+    affinity: dict | None = None
+
+
+# Dedicated event loop for the *_sync facades. All sync callers share
+# this loop's I/O multiplexing and its pooled async client, so N
+# blocked threads drive N concurrent requests over one pool instead of
+# opening N connections. The loop gets its OWN httpx client rather
+# than the package-shared one: keep-alive connections and asyncio
+# primitives are bound to the loop they were created on, so nothing
+# loop-bound may be shared with callers running on another loop.
+# Started lazily on first sync call.
+_sync_loop: asyncio.AbstractEventLoop | None = None
+_sync_http_client: httpx.AsyncClient | None = None
+_sync_loop_lock = threading.Lock()
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop, _sync_http_client
+    if _sync_loop is None:
+        with _sync_loop_lock:
+            if _sync_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(
+                    target=loop.run_forever,
+                    name="nvidia-nim-sync",
+                    daemon=True,
+                ).start()
+                _sync_http_client = new_async_client()
+                _sync_loop = loop
+    return _sync_loop
+
+
+def _payload_cache_key(payload: dict) -> str:
+    """Content hash identifying a prediction request."""
+    canonical = json.dumps(payload, sort_keys=True).encode()
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+class NvidiaNimClient:
+    """Async NIM client sharing one pooled HTTP/2 connection.
+
+    Predictions are long-lived POSTs (seconds to minutes), so the client
+    is async: many in-flight predictions multiplex over one TCP/TLS
+    connection instead of each blocking a worker thread, and keep-alive
+    avoids a fresh handshake per request.
+    """
+
+    def __init__(
+        self,
+        api_key: str | None = None,
+        timeout: float = 300.0,
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.api_key = api_key or os.environ.get("NVIDIA_API_KEY")
+        self.timeout = timeout
+        # Default to the package-wide shared pool so the health check
+        # and predict calls reuse the same keep-alive connections as
+        # any other HTTP work in the process (both endpoints live on
+        # health.api.nvidia.com). Auth and timeout are per-instance, so
+        # they ride on each request instead of the client.
+        self.client = client if client is not None else ASYNC_CLIENT
+        self._headers = self._get_headers()
+        # Most callers keep the default steps; spreading a prebuilt
+        # template beats rebuilding the five-key dict per call.
+        self._payload_template = {
+            "recycling_steps": 3,
+            "sampling_steps": 200,
+            "diffusion_samples": 1,
+            "output_format": "mmcif",
+        }
+        # Memoized PredictionResults keyed by payload hash. LFU keeps
+        # the screening working set (one protein, many repeats) hot;
+        # an lru_cache does not fit here because misses must fall
+        # through to the disk tier and then the network.
+        self._memory_cache: cachetools.LFUCache = cachetools.LFUCache(
+            maxsize=_MEMORY_CACHE_MAX
+        )
+        self._last_health_check: tuple[float, dict] | None = None
+        # Singleflight map: concurrent predictions sharing a payload
+        # hash wait on one Future instead of each issuing a POST. This
+        # covers the race window before the result cache is populated.
+        self._inflight: dict[str, "asyncio.Future[PredictionResult]"] = {}
+        self._inflight_lock = asyncio.Lock()
+        # Lazily built mirror of this client for the *_sync facades.
+        # The inflight futures, the lock above and the httpx pool are
+        # all bound to the loop that first uses them, so sync calls
+        # must not touch this instance's copies; the twin carries its
+        # own, created on (and only ever used from) the sync loop.
+        self._sync_twin: "NvidiaNimClient | None" = None
+
+    def _get_headers(self) -> dict:
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+        }
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _cache_get(self, key: str) -> PredictionResult | None:
+        result = self._memory_cache.get(key)
+        if result is not None:
+            return result
+        path = os.path.join(PREDICTION_CACHE_DIR, f"{key}.json")
+        # mmap the cached JSON so orjson parses straight out of the
+        # page cache instead of a read() copy — structures are large
+        # mmCIF text, so this halves peak memory on disk hits.
+        try:
+            with open(path, "rb") as f:
+                with mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ
+                ) as mm:
+                    result = PredictionResult(**orjson.loads(memoryview(mm)))
+        except (OSError, ValueError, TypeError):
+            return None
+        self._memory_cache[key] = result
+        return result
+
+    def _cache_store(self, key: str, result: PredictionResult) -> None:
+        self._memory_cache[key] = result
+        path = os.path.join(PREDICTION_CACHE_DIR, f"{key}.json")
+        try:
+            os.makedirs(PREDICTION_CACHE_DIR, exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(orjson.dumps(asdict(result)))
+        except OSError:
+            # Cache writes are best-effort; the caller still has the
+            # result.
+            pass
+
+    async def is_available(self) -> dict:
+        """Check whether the NIM endpoint is reachable and authorized.
+
+        The answer is cached for 30 seconds: health barely changes over
+        minutes, and the cache keeps status queries from adding a round
+        trip per call.
+        """
+        if not self.api_key:
+            return {"available": False, "reason": "NVIDIA_API_KEY is not set"}
+        if self._last_health_check is not None:
+            ts, cached = self._last_health_check
+            if time.monotonic() - ts < _HEALTH_CHECK_TTL:
+                return cached
+        try:
+            response = await self.client.get(
+                NIM_HEALTH_ENDPOINT, headers=self._headers, timeout=10.0
+            )
+        except httpx.HTTPError as e:
+            status = {"available": False, "reason": str(e)}
+        else:
+            status = {
+                "available": response.status_code == 200,
+                "status_code": response.status_code,
+            }
+        self._last_health_check = (time.monotonic(), status)
+        return status
+
+    async def predict_structure(
+        self,
+        polymers: list[Polymer],
+        ligands: list[Ligand] | None = None,
+        recycling_steps: int = 3,
+        sampling_steps: int = 200,
+        diffusion_samples: int = 1,
+        output_format: str = "mmcif",
+        use_cache: bool = True,
+    ) -> PredictionResult:
+        """Submit a prediction and return the best structure.
+
+        Predictions are deterministic per payload and take seconds to
+        minutes, so results are memoized by a content hash of the
+        request: an in-memory tier for hot keys plus a JSON file per
+        result under ~/.cache/boltz2 that survives restarts. Concurrent
+        calls with the same payload coalesce onto one in-flight request.
+        Pass use_cache=False to force a fresh prediction.
+        """
+        if not self.api_key:
+            raise NvidiaAPIError("NVIDIA_API_KEY is not set")
+        if len(polymers) > MAX_POLYMERS:
+            raise NvidiaAPIError(
+                f"NIM accepts at most {MAX_POLYMERS} polymers, got {len(polymers)}"
+            )
+        total_residues = sum(len(p.sequence) for p in polymers)
+        if total_residues > MAX_RESIDUES:
+            raise NvidiaAPIError(
+                f"Total residues {total_residues} exceeds the NIM limit "
+                f"of {MAX_RESIDUES}"
+            )
+        payload = {
+            **self._payload_template,
+            "polymers": [p.to_dict() for p in polymers],
+        }
+        if recycling_steps != 3:
+            payload["recycling_steps"] = recycling_steps
+        if sampling_steps != 200:
+            payload["sampling_steps"] = sampling_steps
+        if diffusion_samples != 1:
+            payload["diffusion_samples"] = diffusion_samples
+        if output_format != "mmcif":
+            payload["output_format"] = output_format
+        if ligands:
+            payload["ligands"] = [lig.to_dict() for lig in ligands]
+        if not use_cache:
+            return await self._predict_request(payload, output_format)
+        key = _payload_cache_key(payload)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        async with self._inflight_lock:
+            fut = self._inflight.get(key)
+            if fut is not None:
+                leader = False
+            else:
+                leader = True
+                fut = asyncio.get_running_loop().create_future()
+                self._inflight[key] = fut
+        if not leader:
+            return await fut
+        try:
+            result = await self._predict_request(payload, output_format)
+        except BaseException as e:
+            fut.set_exception(e)
+            # Mark retrieved so a follower-less failure does not log
+            # "exception was never retrieved" at GC time.
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            self._cache_store(key, result)
+            return result
+        finally:
+            async with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    async def _predict_request(
+        self, payload: dict, output_format: str
+    ) -> PredictionResult:
+        # Stream the response into one bytearray and decode it with
+        # orjson: response.json() would hold the body as both str and
+        # dict, and mmCIF-bearing responses run to megabytes when
+        # predictions are fanned out concurrently.
+        body = bytearray()
+        try:
+            # content= with pre-serialized bytes skips httpx's stdlib
+            # json.dumps path; Content-Type rides in the per-instance
+            # headers.
+            async with self.client.stream(
+                "POST",
+                NIM_PREDICT_ENDPOINT,
+                content=orjson.dumps(payload),
+                headers=self._headers,
+                timeout=self.timeout,
+            ) as response:
+                async for chunk in response.aiter_bytes():
+                    body.extend(chunk)
+        except httpx.HTTPError as e:
+            raise NvidiaAPIError(f"NIM request failed: {e}") from e
+        if response.status_code != 200:
+            raise NvidiaAPIError(
+                f"NIM API returned {response.status_code}: "
+                f"{bytes(body[:500]).decode(errors='replace')}"
+            )
+        try:
+            data = orjson.loads(body)
+        except orjson.JSONDecodeError as e:
+            raise NvidiaAPIError(f"NIM API returned invalid JSON: {e}") from e
+        structures = data.get("structures") or []
+        if not structures:
+            raise NvidiaAPIError("NIM API response contained no structures")
+        best = structures[0]
+        return PredictionResult(
+            structure=best.get("structure", ""),
+            structure_format=best.get("format", output_format),
+            confidence_scores=data.get("confidence_scores", []),
+            affinity=data.get("affinities"),
+        )
+
+    async def predict_binding_affinity(
+        self, protein_sequence: str, ligand_smiles: str
+    ) -> dict:
+        """Predict binding affinity of one ligand against one protein."""
+        result = await self.predict_structure(
+            polymers=[
+                Polymer(id="A", molecule_type="protein", sequence=protein_sequence)
+            ],
+            ligands=[Ligand(id="LIG", smiles=ligand_smiles, predict_affinity=True)],
+        )
+        return {
+            "affinity": result.affinity,
+            "confidence_scores": result.confidence_scores,
+            "structure": result.structure,
+        }
+
+    def _get_sync_twin(self) -> "NvidiaNimClient":
+        # The loop must exist before the twin so _sync_http_client is
+        # populated; both are guarded by _sync_loop_lock.
+        _get_sync_loop()
+        if self._sync_twin is None:
+            with _sync_loop_lock:
+                if self._sync_twin is None:
+                    self._sync_twin = NvidiaNimClient(
+                        api_key=self.api_key,
+                        timeout=self.timeout,
+                        client=_sync_http_client,
+                    )
+        return self._sync_twin
+
+    def predict_structure_sync(self, *args, **kwargs) -> PredictionResult:
+        """Blocking facade over predict_structure for sync callers.
+
+        Runs the coroutine on the module-level loop thread, so
+        concurrent sync callers multiplex over one pooled client
+        rather than each opening a connection. The call goes through a
+        twin client bound to that loop — its memory cache diverges from
+        this instance's, but the disk tier is shared, so a prediction
+        already cached by async callers still hits.
+        """
+        twin = self._get_sync_twin()
+        return asyncio.run_coroutine_threadsafe(
+            twin.predict_structure(*args, **kwargs), _get_sync_loop()
+        ).result()
+
+    def predict_binding_affinity_sync(
+        self, protein_sequence: str, ligand_smiles: str
+    ) -> dict:
+        """Blocking facade over predict_binding_affinity."""
+        twin = self._get_sync_twin()
+        return asyncio.run_coroutine_threadsafe(
+            twin.predict_binding_affinity(protein_sequence, ligand_smiles),
+            _get_sync_loop(),
+        ).result()
+
+    async def close(self) -> None:
+        """Close a privately injected client; the shared pools are
+        closed at exit (http.close_all and _close_sync_client)."""
+        if (
+            self.client is not ASYNC_CLIENT
+            and self.client is not _sync_http_client
+            and not self.client.is_closed
+        ):
+            await self.client.aclose()
+
+
+def _close_sync_client() -> None:
+    """Close the sync loop's client on its own loop. Registered atexit."""
+    if _sync_http_client is None or _sync_http_client.is_closed:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(
+            _sync_http_client.aclose(), _get_sync_loop()
+        ).result(timeout=5.0)
+    except Exception:
+        # The daemon loop thread may already be gone; the sockets are
+        # torn down with the process anyway.
+        pass
+
+
+atexit.register(_close_sync_client)
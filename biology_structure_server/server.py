@@ -0,0 +1,403 @@
+"""MCP server exposing Boltz-2 structure prediction tools.
+
+Predictions run either against the NVIDIA NIM cloud API or a local
+boltz installation; "auto" prefers the cloud and falls back to local.
+Tools are async so FastMCP can service concurrent invocations while a
+minutes-long prediction awaits the network.
+"""
+
+import asyncio
+import functools
+import os
+import tempfile
+import time
+
+from fastmcp import FastMCP
+
+from .local_runner import LocalBoltzRunner
+from .nvidia_nim import Ligand, NvidiaAPIError, NvidiaNimClient, Polymer
+from .utils import (
+    estimate_prediction_time,
+    estimate_vram_requirement,
+    generate_output_path,
+    parse_fasta,
+    save_structure,
+    validate_sequence,
+    validate_smiles,
+    warm_up_validators,
+)
+
+mcp = FastMCP("boltz2-structure-prediction")
+
+# Validation and the estimators are pure functions of hashable
+# primitives, and screening workloads repeat the same protein and
+# complex shape across many calls, so memoize at the tool boundary.
+validate_sequence = functools.lru_cache(maxsize=4096)(validate_sequence)
+validate_smiles = functools.lru_cache(maxsize=4096)(validate_smiles)
+# estimate_prediction_time memoizes internally on a residue bucket, so
+# only the VRAM estimator needs a wrapper here.
+estimate_vram_requirement = functools.lru_cache(maxsize=256)(
+    estimate_vram_requirement
+)
+
+DEFAULT_OUTPUT_DIR = os.path.join(tempfile.gettempdir(), "structure_predictions")
+
+_nim_client: NvidiaNimClient | None = None
+_local_runner: LocalBoltzRunner | None = None
+
+_STATUS_TTL = 10.0
+_STATUS_CHECK_TIMEOUT = 2.0
+_status_cache: tuple[float, dict] | None = None
+
+
+def get_nim_client() -> NvidiaNimClient:
+    global _nim_client
+    if _nim_client is None:
+        # Rides on the package-shared HTTP pool, which http.close_all
+        # shuts down at exit.
+        _nim_client = NvidiaNimClient()
+    return _nim_client
+
+
+def get_local_runner() -> LocalBoltzRunner:
+    global _local_runner
+    if _local_runner is None:
+        _local_runner = LocalBoltzRunner()
+    return _local_runner
+
+
+def _build_polymers(sequences: list[dict]) -> list[Polymer]:
+    return [
+        Polymer(
+            id=seq.get("id") or chr(ord("A") + i),
+            molecule_type=seq.get("molecule_type", "protein"),
+            sequence=seq["sequence"],
+        )
+        for i, seq in enumerate(sequences)
+    ]
+
+
+async def _predict_cloud(
+    sequences: list[dict],
+    ligands: list[dict] | None,
+    output_path: str,
+    recycling_steps: int,
+    sampling_steps: int,
+    diffusion_samples: int,
+) -> dict:
+    client = get_nim_client()
+    ligand_objs = [
+        Ligand(id=lig.get("id", f"L{i}"), smiles=lig["smiles"])
+        for i, lig in enumerate(ligands or [])
+    ]
+    try:
+        result = await client.predict_structure(
+            _build_polymers(sequences),
+            ligand_objs,
+            recycling_steps=recycling_steps,
+            sampling_steps=sampling_steps,
+            diffusion_samples=diffusion_samples,
+        )
+    except NvidiaAPIError as e:
+        return {"success": False, "backend": "cloud", "error": str(e)}
+    saved = save_structure(result.structure, output_path)
+    return {
+        "success": True,
+        "backend": "cloud",
+        "structure_path": saved["path"],
+        "structure_size_bytes": saved["size_bytes"],
+        "confidence_scores": result.confidence_scores,
+        "affinity": result.affinity,
+    }
+
+
+def _predict_local(
+    sequences: list[dict],
+    output_path: str,
+    time_estimate: dict,
+    total_residues: int,
+    recycling_steps: int,
+    sampling_steps: int,
+    diffusion_samples: int,
+) -> dict:
+    runner = get_local_runner()
+    availability = runner.is_available()
+    if not availability["available"]:
+        return {
+            "success": False,
+            "backend": "local",
+            "error": "local prediction unavailable",
+            "details": availability,
+        }
+    vram = estimate_vram_requirement(total_residues)
+    gpu = availability["gpu"]
+    if gpu.get("vram_free_gb", 0) < vram["vram_gb"]:
+        return {
+            "success": False,
+            "backend": "local",
+            "error": (
+                f"Prediction needs ~{vram['vram_gb']} GB VRAM but only "
+                f"{gpu.get('vram_free_gb', 0)} GB is free"
+            ),
+            "recommendation": vram["recommendation"],
+        }
+    result = runner.predict_structure(
+        sequences,
+        recycling_steps=recycling_steps,
+        sampling_steps=sampling_steps,
+        diffusion_samples=diffusion_samples,
+    )
+    if not result.success:
+        return {"success": False, "backend": "local", "error": result.error}
+    saved = save_structure(result.get_structure(), output_path)
+    return {
+        "success": True,
+        "backend": "local",
+        "structure_path": saved["path"],
+        "structure_size_bytes": saved["size_bytes"],
+        "confidence_scores": result.confidence_scores,
+        "output_dir": result.output_dir,
+        "time_estimate": time_estimate,
+    }
+
+
+@mcp.tool()
+async def predict_structure(
+    sequences: list[dict],
+    ligands: list[dict] | None = None,
+    backend: str = "auto",
+    output_path: str | None = None,
+    recycling_steps: int = 3,
+    sampling_steps: int = 200,
+    diffusion_samples: int = 1,
+) -> dict:
+    """Predict the 3D structure of a protein/nucleic-acid complex.
+
+    sequences is a list of {id?, molecule_type?, sequence}; ligands an
+    optional list of {id?, smiles}. backend is "auto", "cloud" or
+    "local".
+    """
+    if not sequences:
+        return {"success": False, "error": "No sequences provided"}
+    total_residues = 0
+    for seq in sequences:
+        valid, error = validate_sequence(
+            seq.get("sequence", ""), seq.get("molecule_type", "protein")
+        )
+        if not valid:
+            return {
+                "success": False,
+                "error": f"Invalid sequence '{seq.get('id', '?')}': {error}",
+            }
+        total_residues += len(seq["sequence"])
+    for lig in ligands or []:
+        valid, error = validate_smiles(lig.get("smiles", ""))
+        if not valid:
+            return {
+                "success": False,
+                "error": f"Invalid SMILES '{lig.get('id', '?')}': {error}",
+            }
+    time_estimate = estimate_prediction_time(
+        total_residues, len(sequences), bool(ligands)
+    )
+    if output_path is None:
+        output_path = generate_output_path(DEFAULT_OUTPUT_DIR)
+    if backend == "local":
+        # _predict_local blocks for the whole boltz run (worker pipe
+        # round trip) plus the GPU probe; run it on a worker thread so
+        # the event loop keeps servicing other tool calls meanwhile.
+        result = await asyncio.to_thread(
+            _predict_local,
+            sequences,
+            output_path,
+            time_estimate,
+            total_residues,
+            recycling_steps,
+            sampling_steps,
+            diffusion_samples,
+        )
+    else:
+        result = await _predict_cloud(
+            sequences,
+            ligands,
+            output_path,
+            recycling_steps,
+            sampling_steps,
+            diffusion_samples,
+        )
+        if not result["success"] and backend == "auto":
+            result = await asyncio.to_thread(
+                _predict_local,
+                sequences,
+                output_path,
+                time_estimate,
+                total_residues,
+                recycling_steps,
+                sampling_steps,
+                diffusion_samples,
+            )
+    result.setdefault("time_estimate", time_estimate)
+    return result
+
+
+@mcp.tool()
+async def predict_binding_affinity(
+    protein_sequence: str, ligand_smiles: str
+) -> dict:
+    """Predict binding affinity of a ligand against a protein via NIM."""
+    valid, error = validate_sequence(protein_sequence, "protein")
+    if not valid:
+        return {"success": False, "error": f"Invalid protein sequence: {error}"}
+    valid, error = validate_smiles(ligand_smiles)
+    if not valid:
+        return {"success": False, "error": f"Invalid SMILES: {error}"}
+    client = get_nim_client()
+    try:
+        result = await client.predict_binding_affinity(
+            protein_sequence, ligand_smiles
+        )
+    except NvidiaAPIError as e:
+        return {"success": False, "error": str(e)}
+    return {"success": True, **result}
+
+
+@mcp.tool()
+async def predict_binding_affinity_batch(
+    protein_sequence: str,
+    ligand_smiles_list: list[str],
+    max_concurrent: int = 8,
+) -> dict:
+    """Screen many ligands against one protein concurrently.
+
+    Fans the per-ligand NIM predictions out with asyncio.gather, capped
+    by a semaphore so in-flight requests overlap NIM compute with HTTP
+    wait without tripping rate limits. One ligand failing does not
+    abort the batch; each item reports its own success/error.
+    """
+    valid, error = validate_sequence(protein_sequence, "protein")
+    if not valid:
+        return {"success": False, "error": f"Invalid protein sequence: {error}"}
+    for i, smi in enumerate(ligand_smiles_list):
+        valid, error = validate_smiles(smi)
+        if not valid:
+            return {
+                "success": False,
+                "error": f"Invalid SMILES at index {i}: {error}",
+            }
+    client = get_nim_client()
+    semaphore = asyncio.Semaphore(max_concurrent)
+    # One Polymer shared across the fan-out: its cached to_dict payload
+    # is built once instead of per ligand.
+    protein = Polymer(id="A", molecule_type="protein", sequence=protein_sequence)
+
+    async def _one(smi: str) -> dict:
+        async with semaphore:
+            try:
+                result = await client.predict_structure(
+                    polymers=[protein],
+                    ligands=[Ligand(id="LIG", smiles=smi)],
+                )
+            except NvidiaAPIError as e:
+                return {"smiles": smi, "success": False, "error": str(e)}
+        return {
+            "smiles": smi,
+            "success": True,
+            "affinity": result.affinity,
+            "confidence_scores": result.confidence_scores,
+        }
+
+    results = await asyncio.gather(*[_one(smi) for smi in ligand_smiles_list])
+    return {
+        "success": True,
+        "n_ligands": len(results),
+        "n_failed": sum(1 for r in results if not r["success"]),
+        "results": results,
+    }
+
+
+@mcp.tool()
+async def get_prediction_status() -> dict:
+    """Report availability of the cloud and local prediction backends.
+
+    The result is cached for 10 seconds so UI polling hits the cache,
+    and each backend check is capped at 2 seconds so one hung probe
+    cannot stall the status tool.
+    """
+    global _status_cache
+    if _status_cache is not None:
+        ts, cached = _status_cache
+        if time.monotonic() - ts < _STATUS_TTL:
+            return cached
+    # The cloud check is a network round trip and the local check may
+    # probe the GPU; overlap them instead of running back to back.
+    cloud_status, local_status = await asyncio.gather(
+        asyncio.wait_for(
+            get_nim_client().is_available(), _STATUS_CHECK_TIMEOUT
+        ),
+        asyncio.wait_for(
+            asyncio.to_thread(get_local_runner().is_available),
+            _STATUS_CHECK_TIMEOUT,
+        ),
+        return_exceptions=True,
+    )
+    if isinstance(cloud_status, BaseException):
+        cloud_status = {"available": False, "reason": str(cloud_status) or "check timed out"}
+    if isinstance(local_status, BaseException):
+        local_status = {"available": False, "reason": str(local_status) or "check timed out"}
+    if cloud_status.get("available"):
+        recommendation = "cloud"
+    elif local_status.get("available"):
+        recommendation = "local"
+    else:
+        recommendation = (
+            "none available — set NVIDIA_API_KEY or install boltz on a GPU machine"
+        )
+    status = {
+        "cloud": cloud_status,
+        "local": local_status,
+        "recommendation": recommendation,
+    }
+    _status_cache = (time.monotonic(), status)
+    return status
+
+
+@mcp.tool()
+async def validate_input(
+    sequences: list[dict] | None = None,
+    fasta_content: str | None = None,
+    smiles: list[str] | None = None,
+) -> dict:
+    """Validate sequences, FASTA text and/or SMILES strings."""
+    errors: list[dict] = []
+    checked = 0
+    if sequences:
+        for seq in sequences:
+            valid, error = validate_sequence(
+                seq.get("sequence", ""), seq.get("molecule_type", "protein")
+            )
+            checked += 1
+            if not valid:
+                errors.append({"id": seq.get("id", "?"), "error": error})
+    if fasta_content:
+        # Validate each record as it is parsed and keep only failures;
+        # a screening library FASTA can hold thousands of records, so
+        # no second pass and no materialized record list.
+        for record in parse_fasta(fasta_content):
+            valid, error = validate_sequence(record["sequence"], "protein")
+            checked += 1
+            if not valid:
+                errors.append({"id": record["id"], "error": error})
+    if smiles:
+        for i, smi in enumerate(smiles):
+            valid, error = validate_smiles(smi)
+            checked += 1
+            if not valid:
+                errors.append({"id": f"smiles[{i}]", "error": error})
+    return {"valid": not errors, "checked": checked, "errors": errors}
+
+
+if __name__ == "__main__":
+    # Compile the numba validation kernel (when installed) before
+    # serving, so the first real request does not pay the JIT latency.
+    warm_up_validators()
+    mcp.run()
@@ -0,0 +1,515 @@
+"""Shared helpers for the structure-prediction server."""
+
+import io
+import mmap
+import os
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - optional accelerator
+    numba = None
+
+# The valid-alphabet sets are kept only for the error path (naming the
+# offending characters); every hot-path structure derived from them —
+# the byte LUTs, their NumPy mirrors, and the numba kernel tables — is
+# built exactly once at import below.
+VALID_AMINO_ACIDS = set("ACDEFGHIKLMNPQRSTVWY")
+VALID_DNA_BASES = set("ACGT")
+VALID_RNA_BASES = set("ACGU")
+
+
+def _invalid_lut(valid: set[str]) -> bytes:
+    """256-entry table mapping valid bytes to 0x00 and the rest to 0x01.
+
+    Lets bytes.translate tag invalid characters in one C-level scan
+    instead of hashing every character into a Python set. Both cases of
+    each valid letter map to 0x00, folding case normalization into the
+    same pass so callers never need an .upper() copy.
+    """
+    valid_bytes = {ord(c) for c in valid} | {ord(c.lower()) for c in valid}
+    return bytes(0x00 if b in valid_bytes else 0x01 for b in range(256))
+
+
+_PROTEIN_INVALID = _invalid_lut(VALID_AMINO_ACIDS)
+_DNA_INVALID = _invalid_lut(VALID_DNA_BASES)
+_RNA_INVALID = _invalid_lut(VALID_RNA_BASES)
+
+# NumPy mirrors of the invalid tables, used by batched validation and
+# by the numba kernel: indexing with a uint8 array gathers per-byte
+# invalid flags in one vector op.
+_BATCH_INVALID_LUTS = {
+    "protein": np.frombuffer(_PROTEIN_INVALID, dtype=np.uint8),
+    "dna": np.frombuffer(_DNA_INVALID, dtype=np.uint8),
+    "rna": np.frombuffer(_RNA_INVALID, dtype=np.uint8),
+}
+_NP_LUTS = {
+    _PROTEIN_INVALID: _BATCH_INVALID_LUTS["protein"],
+    _DNA_INVALID: _BATCH_INVALID_LUTS["dna"],
+    _RNA_INVALID: _BATCH_INVALID_LUTS["rna"],
+}
+
+# Fused alphabet table: bit 0 set where a byte is a valid amino acid,
+# bit 1 for DNA, bit 2 for RNA (both cases). AND-reducing the mapped
+# bytes of a record yields every alphabet the whole record fits, so
+# mixed FASTA batches classify in one scan instead of one per type.
+_FUSED_ALPHABET_LUT = (
+    (1 - _BATCH_INVALID_LUTS["protein"])
+    | ((1 - _BATCH_INVALID_LUTS["dna"]) << 1)
+    | ((1 - _BATCH_INVALID_LUTS["rna"]) << 2)
+).astype(np.uint8)
+
+
+if numba is not None:
+
+    @numba.njit(cache=True)
+    def _scan_bytes(buf, lut):  # pragma: no cover - exercised when numba present
+        """One native pass: first invalid byte plus bracket balances.
+
+        Returns (first_invalid_index or -1, paren_balance,
+        bracket_balance); a negative balance means a close appeared
+        before its open and the scan stopped there.
+        """
+        paren = 0
+        bracket = 0
+        for i in range(buf.shape[0]):
+            c = buf[i]
+            if lut[c]:
+                return i, paren, bracket
+            if c == 40:
+                paren += 1
+            elif c == 41:
+                paren -= 1
+                if paren < 0:
+                    return -1, paren, bracket
+            elif c == 91:
+                bracket += 1
+            elif c == 93:
+                bracket -= 1
+                if bracket < 0:
+                    return -1, paren, bracket
+        return -1, paren, bracket
+
+else:
+    _scan_bytes = None
+
+# All bytes permitted: used when the kernel is run purely for its
+# bracket balancing.
+_NO_INVALID = np.zeros(256, dtype=np.uint8)
+
+
+def warm_up_validators() -> bool:
+    """Precompile the numba scan kernel so the first real request does
+    not pay JIT latency. Returns True when the native kernel is active."""
+    if _scan_bytes is None:
+        return False
+    _scan_bytes(
+        np.frombuffer(b"ACDC([N])", dtype=np.uint8), _NO_INVALID
+    )
+    return True
+
+
+def _scan_invalid(
+    sequence: str, lut: bytes, valid: set[str], label: str
+) -> tuple[bool, str | None]:
+    try:
+        encoded = sequence.encode("ascii")
+    except UnicodeEncodeError:
+        return False, f"Invalid {label}(s): non-ASCII character"
+    if _scan_bytes is not None:
+        first_invalid, _, _ = _scan_bytes(
+            np.frombuffer(encoded, dtype=np.uint8), _NP_LUTS[lut]
+        )
+        if first_invalid < 0:
+            return True, None
+    elif b"\x01" not in encoded.translate(lut):
+        return True, None
+    return False, _invalid_message(sequence, valid, label)
+
+
+def _invalid_message(sequence: str, valid: set[str], label: str) -> str:
+    """Cold path: name the offending characters for the error tuple.
+
+    Only failures pay for the case fold and set construction here; the
+    success path above never allocates beyond the translated mask.
+    """
+    invalid = set(sequence.upper()) - valid
+    return f"Invalid {label}(s): {', '.join(sorted(invalid))}"
+
+
+def validate_protein_sequence(sequence: str) -> tuple[bool, str | None]:
+    """Check that a sequence contains only the 20 standard amino acids."""
+    if not sequence:
+        return False, "Sequence is empty"
+    return _scan_invalid(
+        sequence.strip(), _PROTEIN_INVALID, VALID_AMINO_ACIDS, "amino acid"
+    )
+
+
+def validate_dna_sequence(sequence: str) -> tuple[bool, str | None]:
+    """Check that a sequence contains only A/C/G/T."""
+    if not sequence:
+        return False, "Sequence is empty"
+    return _scan_invalid(
+        sequence.strip(), _DNA_INVALID, VALID_DNA_BASES, "DNA base"
+    )
+
+
+def validate_rna_sequence(sequence: str) -> tuple[bool, str | None]:
+    """Check that a sequence contains only A/C/G/U."""
+    if not sequence:
+        return False, "Sequence is empty"
+    return _scan_invalid(
+        sequence.strip(), _RNA_INVALID, VALID_RNA_BASES, "RNA base"
+    )
+
+
+def classify_sequences_batch(sequences: list[str]) -> list[str | None]:
+    """Infer the molecule type of many sequences in one fused scan.
+
+    Maps the concatenated batch through the fused alphabet table and
+    AND-reduces per record, so each byte is touched once regardless of
+    how many alphabets are in play. A record that fits several
+    alphabets reports the most specific one (dna, then rna, then
+    protein); a record fitting none — or empty or non-ASCII — comes
+    back None.
+    """
+    results: list[str | None] = [None] * len(sequences)
+    if not sequences:
+        return results
+    chunks = []
+    offsets = []
+    spans = []
+    pos = 0
+    for i, seq in enumerate(sequences):
+        seq = seq.strip()
+        if not seq:
+            continue
+        try:
+            encoded = seq.encode("ascii")
+        except UnicodeEncodeError:
+            continue
+        chunks.append(encoded)
+        offsets.append(pos)
+        spans.append(i)
+        pos += len(encoded)
+    if not chunks:
+        return results
+    buf = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+    masks = np.bitwise_and.reduceat(
+        _FUSED_ALPHABET_LUT[buf], np.asarray(offsets, dtype=np.intp)
+    )
+    for i, mask in zip(spans, masks):
+        if mask & 0b010:
+            results[i] = "dna"
+        elif mask & 0b100:
+            results[i] = "rna"
+        elif mask & 0b001:
+            results[i] = "protein"
+    return results
+
+
+def validate_sequences_batch(
+    sequences: list[str], molecule_type: str
+) -> list[bool]:
+    """Validate many same-type sequences in one vectorized pass.
+
+    Concatenates the batch into a single byte buffer and gathers
+    per-byte invalid flags through a 256-entry NumPy table, then sums
+    per record with np.add.reduceat — the whole batch is checked
+    without entering the per-sequence Python validator. Empty or
+    non-ASCII sequences are marked invalid. Returns one bool per input.
+    """
+    lut = _BATCH_INVALID_LUTS.get(molecule_type.lower())
+    if lut is None:
+        return [False] * len(sequences)
+    if not sequences:
+        return []
+    ok = [True] * len(sequences)
+    chunks = []
+    offsets = []
+    spans = []  # indices into the result for non-degenerate records
+    pos = 0
+    for i, seq in enumerate(sequences):
+        seq = seq.strip()
+        if not seq:
+            ok[i] = False
+            continue
+        try:
+            encoded = seq.encode("ascii")
+        except UnicodeEncodeError:
+            ok[i] = False
+            continue
+        chunks.append(encoded)
+        offsets.append(pos)
+        spans.append(i)
+        pos += len(encoded)
+    if not chunks:
+        return ok
+    buf = np.frombuffer(b"".join(chunks), dtype=np.uint8)
+    invalid_counts = np.add.reduceat(
+        lut[buf].astype(np.intp), np.asarray(offsets, dtype=np.intp)
+    )
+    for i, count in zip(spans, invalid_counts):
+        if count:
+            ok[i] = False
+    return ok
+
+
+# Dispatch table for validate_sequence, pre-seeded with the case
+# variants that actually show up in requests so the common lookups
+# skip the .lower() allocation entirely.
+_VALIDATORS = {
+    "protein": validate_protein_sequence,
+    "dna": validate_dna_sequence,
+    "rna": validate_rna_sequence,
+}
+_VALIDATORS.update(
+    {
+        variant: fn
+        for name, fn in list(_VALIDATORS.items())
+        for variant in (name.upper(), name.capitalize())
+    }
+)
+
+
+def validate_sequence(
+    sequence: str, molecule_type: str
+) -> tuple[bool, str | None]:
+    """Validate a sequence against the alphabet of its molecule type."""
+    validator = _VALIDATORS.get(molecule_type) or _VALIDATORS.get(
+        molecule_type.lower()
+    )
+    if validator is None:
+        return False, f"Unknown molecule type: {molecule_type}"
+    return validator(sequence)
+
+
+def validate_smiles(smiles: str) -> tuple[bool, str | None]:
+    """Sanity-check a SMILES string (balanced parentheses and brackets)."""
+    if not smiles:
+        return False, "SMILES string is empty"
+    # str.count is a C-level scan; mismatched totals reject without any
+    # per-character Python work, and bracket-free strings (most simple
+    # SMILES) never reach the nesting scan at all. Matching nonzero
+    # totals still need it — ')(' balances by count but not by order.
+    open_parens = smiles.count("(")
+    if open_parens != smiles.count(")"):
+        return False, "Unbalanced parentheses in SMILES"
+    open_brackets = smiles.count("[")
+    if open_brackets != smiles.count("]"):
+        return False, "Unbalanced brackets in SMILES"
+    if open_parens or open_brackets:
+        # Totals match; catch close-before-open with a vectorized
+        # running depth instead of the old per-char if/elif loop.
+        arr = np.frombuffer(
+            smiles.encode("latin-1", "replace"), dtype=np.uint8
+        )
+        if _scan_bytes is not None:
+            _, paren_balance, bracket_balance = _scan_bytes(arr, _NO_INVALID)
+            if paren_balance < 0:
+                return False, "Unbalanced parentheses in SMILES"
+            if bracket_balance < 0:
+                return False, "Unbalanced brackets in SMILES"
+            return True, None
+        if open_parens:
+            depth = np.cumsum(
+                (arr == 40).astype(np.int8) - (arr == 41).astype(np.int8)
+            )
+            if depth.min() < 0:
+                return False, "Unbalanced parentheses in SMILES"
+        if open_brackets:
+            depth = np.cumsum(
+                (arr == 91).astype(np.int8) - (arr == 93).astype(np.int8)
+            )
+            if depth.min() < 0:
+                return False, "Unbalanced brackets in SMILES"
+    return True, None
+
+
+def parse_fasta(fasta_content):
+    """Stream FASTA records of {id, description, sequence}.
+
+    Takes a str or a file-like object and yields one record at a time,
+    accumulating each sequence in a bytearray, so peak memory is one
+    record rather than the whole file plus a list of its lines.
+    """
+    if isinstance(fasta_content, str):
+        # No upfront strip: that would copy the whole buffer just to
+        # trim edge whitespace the per-line handling skips anyway.
+        stream = io.StringIO(fasta_content)
+    else:
+        stream = fasta_content
+    current_id: str | None = None
+    current_desc = ""
+    current_seq = bytearray()
+    for line in stream:
+        # Headers are identified without stripping first — FASTA lines
+        # do not start with whitespace, so only the lines actually kept
+        # pay for an rstrip.
+        if line.startswith(">"):
+            if current_id is not None:
+                yield {
+                    "id": current_id,
+                    "description": current_desc,
+                    "sequence": current_seq.decode("ascii"),
+                }
+            parts = line[1:].split(None, 1)
+            current_id = parts[0] if parts else ""
+            current_desc = parts[1].rstrip() if len(parts) > 1 else ""
+            current_seq = bytearray()
+        elif current_id is not None:
+            stripped = line.rstrip()
+            if stripped:
+                current_seq.extend(stripped.encode("ascii", "replace"))
+    if current_id is not None:
+        yield {
+            "id": current_id,
+            "description": current_desc,
+            "sequence": current_seq.decode("ascii"),
+        }
+
+
+def parse_fasta_list(fasta_content) -> list[dict]:
+    """Materialized parse_fasta for callers that need random access."""
+    return list(parse_fasta(fasta_content))
+
+
+def generate_output_path(
+    output_dir: str, prefix: str = "structure", extension: str = "cif"
+) -> str:
+    """Build a timestamped output file path inside output_dir."""
+    # time.strftime over localtime skips the datetime object that
+    # datetime.now().strftime allocated per call — batch predictions
+    # generate many of these paths.
+    timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime())
+    return os.path.join(output_dir, f"{prefix}_{timestamp}.{extension}")
+
+
+# Structures at or above this size are written through mmap; below it
+# a plain buffered write wins (no page-table setup cost).
+_MMAP_THRESHOLD = 1 << 20
+
+
+def save_structure(structure: str, output_path: str) -> dict:
+    """Write structure text to output_path, creating parent directories.
+
+    Encodes once and writes binary, so a multi-MB mmCIF goes to the OS
+    in one write instead of looping through the text-mode codec, and
+    the reported size is the on-disk byte count. Structures over 1 MiB
+    are copied straight into a mapped file — one memcpy into the page
+    cache with no intermediate write buffer.
+    """
+    parent = os.path.dirname(output_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    data = structure.encode("utf-8")
+    n = len(data)
+    if n >= _MMAP_THRESHOLD:
+        # O_RDWR, not O_WRONLY: a shared writable mapping needs read
+        # access to the descriptor.
+        fd = os.open(
+            output_path, os.O_CREAT | os.O_RDWR | os.O_TRUNC, 0o644
+        )
+        try:
+            os.ftruncate(fd, n)
+            with mmap.mmap(fd, n, access=mmap.ACCESS_WRITE) as mm:
+                mm[:] = data
+        finally:
+            os.close(fd)
+    else:
+        with open(output_path, "wb", buffering=1 << 20) as f:
+            f.write(data)
+    return {"success": True, "path": output_path, "size_bytes": n}
+
+# GPU tiers sorted by usable VRAM headroom in GB. Shared by the VRAM
+# estimator and the local runner's hardware recommendation so the
+# thresholds live in exactly one place, and looked up with bisect
+# instead of an if/elif ladder.
+_GPU_TIERS = [
+    (22, "RTX_4090_24GB", "RTX 4090 or better"),
+    (30, "RTX_5090_32GB", "RTX 5090 or better"),
+    (38, "A100_40GB", "A100 40GB or better"),
+    (78, "A100_80GB", "A100 80GB"),
+]
+_TIER_THRESHOLDS = [tier[0] for tier in _GPU_TIERS]
+_CLOUD_FALLBACK = "Use the NVIDIA NIM cloud API (exceeds single-GPU VRAM)"
+
+
+def recommend_gpu(vram_needed_gb: float) -> str:
+    """Smallest GPU tier that fits the given VRAM need, or the cloud API."""
+    idx = bisect_left(_TIER_THRESHOLDS, vram_needed_gb)
+    if idx < len(_GPU_TIERS):
+        return _GPU_TIERS[idx][2]
+    return _CLOUD_FALLBACK
+
+
+def estimate_vram_requirement(total_residues: int) -> dict:
+    """Estimate the VRAM a Boltz-2 prediction needs, in GB.
+
+    Closed-form in residue count (empirical fit: fixed model/activation
+    base plus linear pair-representation growth), so there is no bounds
+    re-checking per call.
+    """
+    vram_gb = round(6.0 + 0.008 * total_residues + 4e-6 * total_residues**2, 1)
+    return {
+        "total_residues": total_residues,
+        "vram_gb": vram_gb,
+        "fits_on": {
+            name: vram_gb <= threshold for threshold, name, _ in _GPU_TIERS
+        },
+        "recommendation": recommend_gpu(vram_gb),
+    }
+
+
+class _TimeEstimate(NamedTuple):
+    estimated_minutes: float
+    estimated_seconds: int
+    speed: str
+
+
+@lru_cache(maxsize=4096)
+def _estimate_time(
+    residue_bucket: int, num_polymers: int, has_ligand: bool
+) -> _TimeEstimate:
+    if residue_bucket < 200:
+        base_minutes = 1.0
+    elif residue_bucket < 500:
+        base_minutes = 3.0
+    elif residue_bucket < 1000:
+        base_minutes = 8.0
+    else:
+        base_minutes = 15.0
+    minutes = base_minutes + 0.5 * num_polymers + (2.0 if has_ligand else 0.0)
+    if minutes < 2:
+        speed = "fast"
+    elif minutes < 10:
+        speed = "moderate"
+    else:
+        speed = "slow"
+    return _TimeEstimate(round(minutes, 1), int(minutes * 60), speed)
+
+
+def estimate_prediction_time(
+    total_residues: int, num_polymers: int, has_ligand: bool
+) -> dict:
+    """Rough wall-clock estimate for a Boltz-2 prediction.
+
+    The arithmetic is memoized on a residue bucket of 10 — lossless,
+    since every threshold in the ladder is a multiple of 10 — so
+    repeated submissions of similar complexes hit a cached namedtuple
+    and only pay for the result dict.
+    """
+    est = _estimate_time(
+        (total_residues // 10) * 10, num_polymers, has_ligand
+    )
+    return {
+        "estimated_minutes": est.estimated_minutes,
+        "estimated_seconds": est.estimated_seconds,
+        "speed": est.speed,
+    }
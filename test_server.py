@@ -0,0 +1,149 @@
+"""Smoke tests for the microscopy metadata MCP server.
+
+Generates a small OME-TIFF and runs every tool against it. Run
+directly: python test_server.py
+"""
+
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import tifffile
+
+from biology_microscopy_server.core import (
+    batch_get_image_info,
+    get_channel_info,
+    get_image_info,
+    get_physical_dimensions,
+    list_scenes,
+    read_microscopy_metadata,
+    validate_microscopy_file,
+)
+
+# fastmcp wraps tools in FunctionTool objects; unwrap to the plain
+# function for direct calls.
+_fn = lambda tool: getattr(tool, "fn", tool)
+
+CHANNEL_NAMES = ["DAPI", "GFP", "RFP"]
+SHAPE = (3, 5, 256, 256)  # C, Z, Y, X
+
+# Built once: tifffile only reads the metadata mapping when writing,
+# so every created test file can share the same template.
+_TEST_META = {
+    "axes": "CZYX",
+    "Channel": {"Name": CHANNEL_NAMES},
+    "PhysicalSizeX": 0.065,
+    "PhysicalSizeXUnit": "µm",
+    "PhysicalSizeY": 0.065,
+    "PhysicalSizeYUnit": "µm",
+    "PhysicalSizeZ": 0.29,
+    "PhysicalSizeZUnit": "µm",
+}
+
+
+def create_test_ome_tiff(path: str) -> str:
+    """Write a deterministic OME-TIFF test image.
+
+    The pixel content is irrelevant to metadata tests, so the data is
+    a ramp (arange modulo 255) rather than random — no RNG cost, and
+    identical bytes on every run.
+    """
+    data = (np.arange(np.prod(SHAPE)).reshape(SHAPE) % 255).astype(np.uint8)
+    tifffile.imwrite(path, data, ome=True, metadata=_TEST_META)
+    return path
+
+
+def test_validate(test_file: str) -> None:
+    result = _fn(validate_microscopy_file)(test_file)
+    assert result["valid"], result
+    assert result["detected_format"] == "tiff", result
+    assert result["dimensions"]["C"] == 3, result
+
+
+def test_image_info(test_file: str) -> None:
+    result = _fn(get_image_info)(test_file)
+    assert "error" not in result, result
+    dims = result["dimensions"]
+    assert dims["C"] == 3 and dims["Z"] == 5, dims
+    assert dims["Y"] == 256 and dims["X"] == 256, dims
+
+
+def test_channel_info(test_file: str) -> None:
+    result = _fn(get_channel_info)(test_file)
+    assert "error" not in result, result
+    assert result["channel_names"] == CHANNEL_NAMES, result
+
+
+def test_physical_dimensions(test_file: str) -> None:
+    result = _fn(get_physical_dimensions)(test_file)
+    assert "error" not in result, result
+    sizes = result["physical_pixel_sizes"]
+    assert abs(sizes["X"] - 0.065) < 1e-9, sizes
+    assert abs(sizes["Z"] - 0.29) < 1e-9, sizes
+
+
+def test_list_scenes(test_file: str) -> None:
+    result = _fn(list_scenes)(test_file)
+    assert "error" not in result, result
+    assert result["n_scenes"] >= 1, result
+
+
+def test_read_metadata(test_file: str) -> None:
+    result = _fn(read_microscopy_metadata)(test_file)
+    assert "error" not in result, result
+    assert result["dimensions"]["C"] == 3, result
+    assert result["channel_names"] == CHANNEL_NAMES, result
+
+
+def test_batch_image_info(test_file: str) -> None:
+    result = _fn(batch_get_image_info)([test_file, test_file])
+    assert len(result) == 2, result
+    assert all("error" not in r for r in result), result
+
+
+TESTS = [
+    ("validate_microscopy_file", test_validate),
+    ("get_image_info", test_image_info),
+    ("get_channel_info", test_channel_info),
+    ("get_physical_dimensions", test_physical_dimensions),
+    ("list_scenes", test_list_scenes),
+    ("read_microscopy_metadata", test_read_metadata),
+    ("batch_get_image_info", test_batch_image_info),
+]
+
+
+def main() -> int:
+    # The tests are independent and read-only, and tifffile/bioio
+    # release the GIL during I/O, so run them all at once and let the
+    # metadata reads overlap.
+    print_lock = threading.Lock()
+    with tempfile.NamedTemporaryFile(suffix=".ome.tif") as tmp:
+        test_file = create_test_ome_tiff(tmp.name)
+        failed = 0
+        with ThreadPoolExecutor(max_workers=len(TESTS)) as executor:
+            futures = {
+                executor.submit(test, test_file): name
+                for name, test in TESTS
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    future.result()
+                except AssertionError as e:
+                    failed += 1
+                    with print_lock:
+                        print(f"FAIL {name}: {e}")
+                else:
+                    with print_lock:
+                        print(f"ok   {name}")
+    if failed:
+        print(f"{failed}/{len(TESTS)} tests failed")
+        return 1
+    print(f"all {len(TESTS)} tests passed")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())